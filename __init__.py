@@ -9,30 +9,54 @@ bl_info = {
     "category": "Rigging"
 }
 
+# On an addon reload, reload the bonemaps too so edited maps rebuild PRECOMPUTED_BONE_MAPS
+# (importing the submodule binds "bonemaps" in this namespace)
+if "bpy" in locals():
+    import importlib
+    if "bonemaps" in locals():
+        importlib.reload(bonemaps)
+
 import bpy
 import bpy.utils.previews
 import os
 import re
+import sys
 import math
+from operator import itemgetter
+from types import MappingProxyType
 from mathutils import Quaternion
 from .bonemaps import CHARACTER_BONE_MAPS
 from mathutils import Matrix, Vector
 
 # Global variables
 custom_icons = None
+# Original bone data per armature (keyed by as_pointer), filled by the smash-ultimate-blender conversion.
+ORIGINAL_BONE_DATA = {}
+# ID property set on a converted armature object; polls and the rename/trim warnings test it
+# instead of fetching the pointer and looking it up in ORIGINAL_BONE_DATA
+ULTI_CONVERTED_PROP = "ssb4_ulti_converted"
 NULL_RE  = re.compile(r"^S_(\D+?)(\d+)_null$")
 SWING_RE = re.compile(r"^S_(\D+?)(\d+)$")
+SWING_PREFIXES = ("S_", "SWG_")
+# Prefix carried by HL2 bone names (index 0 of the bonemap)
+VALVEBIPED_PREFIX = "ValveBiped."
+VALVEBIPED_LEN = len(VALVEBIPED_PREFIX)
+# Bonemap tuple index for each target format: (HL2, TF2, SSB4, SSBU)
+FORMAT_INDEX = {'HL2': 0, 'TF2': 1, 'SSB4': 2, 'SSBU': 3}
+# Constant rotations, frozen so the shared matrices can't be modified in place
+ROT_X_POS90 = Matrix.Rotation(math.radians(90), 4, 'X').freeze()
+ROT_Z_NEG90 = Matrix.Rotation(math.radians(-90), 4, 'Z').freeze()
 
 # ------------------------------------------------------------
 # Scene-level Properties
 # ------------------------------------------------------------
+# "Common" should always appear at the top. Built once: the bonemaps are static, and
+# Blender needs the strings returned by an items callback to stay referenced.
+CHARACTER_ITEMS = (("Common", "Common", "Use common bone mapping"),) + tuple(
+    (k, k, "Rename bones for %s" % k) for k in CHARACTER_BONE_MAPS.keys() if k != "Common")
+
 def character_items_scene(self, context):
-    # "Common" should always appear at the top.
-    items = [("Common", "Common", "Use common bone mapping")]
-    for k in CHARACTER_BONE_MAPS.keys():
-        if k != "Common":
-            items.append((k, k, "Rename bones for %s" % k))
-    return tuple(items)
+    return CHARACTER_ITEMS
 
 bpy.types.Scene.ssb4_character = bpy.props.EnumProperty(
     name="Active Fighter",
@@ -109,25 +133,39 @@ def unload_custom_icons():
     custom_icons = None
     
 def get_target_bones(armature):
-    """Checks the toggle setting to determine whether to operate on all bones or only selected."""
+    """
+    Checks the toggle setting to determine whether to operate on all bones or only selected.
+    Returns a list of the selected bones, or the armature's own bone collection (no copy) for ALL.
+    """
     scope = bpy.context.scene.ssb4_scope
     if scope == 'SELECTED':
-        return [b for b in armature.bones if getattr(b, 'select', False)]
-    return list(armature.bones)
+        return [b for b in armature.bones if b.select]
+    return armature.bones
 
 def normalize_bone_name(name):
     """Strip 'ValveBiped.' prefix from index 0 of the bonemap, otherwise return name unchanged."""
-    if name.startswith("ValveBiped."):
-        return name[len("ValveBiped."):]
+    if name.startswith(VALVEBIPED_PREFIX):
+        return name[VALVEBIPED_LEN:]
     return name
 
 def get_bone_name_set(bones):
     """Return a set of every bone.name plus its normalized form."""
-    names = set()
-    for b in bones:
-        names.add(b.name)
-        names.add(normalize_bone_name(b.name))
-    return names
+    return {n for name in (b.name for b in bones) for n in (name, normalize_bone_name(name))}
+
+def strip_affixes(s, prefix, suffix=""):
+    """Return s with prefix and suffix removed, or None if it doesn't have both."""
+    if s.startswith(prefix) and s.endswith(suffix):
+        return s[len(prefix):len(s) - len(suffix)]
+    return None
+
+def split_trailing_digits(s):
+    """Split a trailing run of digits off a string, returning (prefix, digits) or None."""
+    i = len(s)
+    while i and s[i - 1].isdecimal():
+        i -= 1
+    if i == len(s):
+        return None
+    return s[:i], s[i:]
 
 def build_bone_map(maps, fmt_i):
     """
@@ -136,14 +174,153 @@ def build_bone_map(maps, fmt_i):
     """
     bone_map = {}
     for entry in maps:
-        raw_tgt = entry[fmt_i]  # DON'T normalize here
+        raw_tgt = sys.intern(entry[fmt_i])  # DON'T normalize here
         for src in entry:
-            bone_map[src] = raw_tgt
+            bone_map[sys.intern(src)] = raw_tgt
             stripped = normalize_bone_name(src)
             if stripped != src:
-                bone_map[stripped] = raw_tgt
-    return bone_map
+                bone_map[sys.intern(stripped)] = raw_tgt
+    return MappingProxyType(bone_map)
+
+# Every fighter's bonemap merged with 'Common', flattened per target format at import
+_, _, COMMON_BONE_LIST = CHARACTER_BONE_MAPS["Common"]
+PRECOMPUTED_BONE_MAPS = {
+    character: {
+        fmt: build_bone_map(COMMON_BONE_LIST + char_list, fmt_i)
+        for fmt, fmt_i in FORMAT_INDEX.items()}
+    for character, (_, _, char_list) in CHARACTER_BONE_MAPS.items()
+}
 
+def get_bone_map(character, target_format):
+    """Return the read-only precomputed bone map, falling back to 'Common' for unmapped fighters."""
+    maps = PRECOMPUTED_BONE_MAPS.get(character) or PRECOMPUTED_BONE_MAPS["Common"]
+    return maps[target_format]
+
+
+# Swing/null-swing renamers, one per target format
+# ------------------------------------------------------------
+def bump_parent_core(parent_name, prefix, suffix="", strip_null=False):
+    """Return a swing parent's core with its trailing number bumped by +1, or None if the parent doesn't match."""
+    core = strip_affixes(parent_name, prefix, suffix)
+    if core is None:
+        return None
+    if strip_null and core.endswith("_null"):
+        core = core[:-5]
+    split = split_trailing_digits(core)
+    if split:
+        pre, num = split
+        core = pre + str(int(num) + 1)
+    return core
+
+def classify_parent(parent_name):
+    """
+    Return a parent's bumped cores as (SWG_…__swing core, S_… core), None where the name doesn't match.
+    Only depends on the name, so rename passes cache it for parents shared by several children.
+    """
+    if not parent_name:
+        return (None, None)
+    return (bump_parent_core(parent_name, "SWG_", "__swing"),
+            bump_parent_core(parent_name, "S_", strip_null=True))
+
+def rename_swing_ssb4(orig, parent_cores, bone_map, do_swing, do_null_swing):
+    """SSBU→SSB4: S_…_null bumps off its SWG_…__swing parent into SWG_…__shit, S_… becomes SWG_…__swing."""
+    if do_null_swing:
+        core = strip_affixes(orig, "S_", "_null")
+        if core is not None:
+            bumped = parent_cores[0]
+            if bumped is not None:
+                core = bumped
+            return "SWG_" + core + "__shit"
+    if do_swing:
+        core = strip_affixes(orig, "S_")
+        if core is not None:
+            return "SWG_" + core + "__swing"
+    return None
+
+def rename_swing_ssbu(orig, parent_cores, bone_map, do_swing, do_null_swing):
+    """SSB4→SSBU: SWG_…__shit bumps off its S_… parent into S_…_null, SWG_…__swing becomes S_…."""
+    if do_null_swing:
+        core = strip_affixes(orig, "SWG_", "__shit")
+        if core is not None:
+            bumped = parent_cores[1]
+            if bumped is not None:
+                core = bumped
+            return "S_" + core + "_null"
+    if do_swing:
+        core = strip_affixes(orig, "SWG_", "__swing")
+        if core is not None:
+            return "S_" + core
+    return None
+
+def rename_swing_valve(orig, parent_cores, bone_map, do_swing, do_null_swing):
+    """HL2/TF2: mirror the SSB4/SSBU bump logic, then look the result up in bone_map."""
+    if not do_null_swing:
+        return None
+
+    # SSBU-style null → bump off SWG parent and lookup swing
+    core = strip_affixes(orig, "S_", "_null")
+    if core is not None:
+        bumped = parent_cores[0]
+        if bumped is not None:
+            core = bumped
+        return bone_map.get("SWG_" + core + "__swing")
+
+    # SSB4-style null → bump off S_ parent and lookup null
+    core = strip_affixes(orig, "SWG_", "__shit")
+    if core is not None:
+        bumped = parent_cores[1]
+        if bumped is not None:
+            core = bumped
+        return bone_map.get("S_" + core + "_null")
+    return None
+
+SWING_RENAMERS = {
+    'SSB4': rename_swing_ssb4,
+    'SSBU': rename_swing_ssbu,
+    'HL2':  rename_swing_valve,
+    'TF2':  rename_swing_valve,
+}
+
+def compute_new_names(entries, bone_map, target_format, do_swing, do_null_swing, trim_valve):
+    """
+    Name-only core of rename_bones, free of any Blender API access.
+    Takes (name, parent_name) pairs ordered parents-first and returns the new name (or None) for each,
+    resolving parent names through the renames made earlier in the same pass.
+    """
+    bone_map_get = bone_map.get
+    rename_swing = SWING_RENAMERS[target_format]
+    any_swing_rules = do_swing or do_null_swing
+    renames = {}
+    parent_classes = {}
+    new_names = []
+
+    for orig, parent_name in entries:
+        # 1) Direct Map?
+        new = bone_map_get(orig)
+        if new is not None:
+            # Honor the user’s Valve naming preferences
+            if trim_valve:
+                new = normalize_bone_name(new)
+
+        # Only swing/null-swing bones go further (and only if a swing toggle is on)
+        elif any_swing_rules and orig.startswith(SWING_PREFIXES):
+            # 2) Swing/null-swing rules for the target format, against the parent's current name
+            parent_name = renames.get(parent_name, parent_name)
+            parent_cores = parent_classes.get(parent_name)
+            if parent_cores is None:
+                parent_cores = parent_classes[parent_name] = classify_parent(parent_name)
+            new = rename_swing(orig, parent_cores, bone_map, do_swing, do_null_swing)
+
+            # 3) fallback swing
+            if not new and do_swing:
+                core = strip_affixes(orig, "S_")
+                if core is not None:
+                    new = bone_map_get("SWG_" + core + "__swing")
+
+        if new and new != orig:
+            renames[orig] = new
+        new_names.append(new)
+    return new_names
 
 # Primary renaming function
 # ------------------------------------------------------------
@@ -171,120 +348,35 @@ def rename_bones(character, target_format='SSBU', ignore_scope=False):
     armature = obj.data
 
     # Collect target bones
-    bones = list(armature.bones) if ignore_scope else get_target_bones(armature)
+    bones = armature.bones if ignore_scope else get_target_bones(armature)
 
     # Sort by hierarchy depth so parents rename before children
-    def depth(b):
-        d = 0
+    # (each parent chain is walked once, shared ancestors come from the cache)
+    depths = {}
+    for b in bones:
+        chain = []
         cur = b
-        while cur.parent:
-            d += 1
+        while cur and cur not in depths:
+            chain.append(cur)
             cur = cur.parent
-        return d
-    bones.sort(key=depth)
-
-    # --- Build Direct Map ---
-    common_clav, common_leg, common_list = CHARACTER_BONE_MAPS.get("Common", (False, False, []))
-    char_clav, char_leg, char_list = CHARACTER_BONE_MAPS.get(character, (False, False, []))
-    maps = common_list + char_list
-    fmt_i = {'HL2': 0, 'TF2': 1, 'SSB4': 2, 'SSBU': 3}[target_format]
+        d = depths[cur] if cur else -1
+        for c in reversed(chain):
+            d += 1
+            depths[c] = d
+    bones = sorted(bones, key=depths.__getitem__)
+
+    # --- Direct Map ---
     prefs = bpy.context.user_preferences.addons[__name__].preferences
+    bone_map = get_bone_map(character, target_format)
+    trim_valve = target_format in ('HL2', 'TF2') and prefs.trim_valvebiped
 
-    bone_map = build_bone_map(maps, fmt_i)
+    # Read names once, work out every new name without touching Blender, then write them back
+    entries = [(b.name, b.parent.name if b.parent else None) for b in bones]
+    new_names = compute_new_names(
+        entries, bone_map, target_format, do_swing, do_null_swing, trim_valve)
 
-    DIGITS = re.compile(r'^(.*?)(\d+)$')
     renamed = 0
-
-    for bone in bones:
-        orig = bone.name
-        new = None
-
-        # 1) Direct Map?
-        if orig in bone_map:
-            new = bone_map[orig]
-            # Honor the user’s Valve naming preferences
-            if target_format in ('HL2','TF2') and prefs.trim_valvebiped:
-                new = normalize_bone_name(new)
-
-        else:
-            # 2) to SSB4?
-            if target_format == 'SSB4':
-                if do_null_swing and orig.startswith("S_") and orig.endswith("_null"):
-                    p = bone.parent
-                    if p and p.name.startswith("SWG_") and p.name.endswith("__swing"):
-                        core = p.name[4:-7]
-                        m = DIGITS.match(core)
-                        if m:
-                            pre, num = m.groups()
-                            core = pre + str(int(num) + 1)
-                        new = "SWG_%s__shit" % core
-                    else:
-                        core = orig[2:-5]
-                        new = "SWG_%s__shit" % core
-                elif do_swing and orig.startswith("S_"):
-                    core = orig[2:]
-                    new = "SWG_%s__swing" % core
-
-            # 3) to SSBU?
-            elif target_format == 'SSBU':
-                if do_null_swing and orig.startswith("SWG_") and orig.endswith("__shit"):
-                    p = bone.parent
-                    if p and p.name.startswith("S_"):
-                        core = p.name[2:]
-                        if core.endswith("_null"):
-                            core = core[:-5]
-                        m = DIGITS.match(core)
-                        if m:
-                            pre, num = m.groups()
-                            core = pre + str(int(num) + 1)
-                        new = "S_%s_null" % core
-                    if not new:
-                        core = orig[4:-6]
-                        new = "S_%s_null" % core
-                elif do_swing and orig.startswith("SWG_") and orig.endswith("__swing"):
-                    core = orig[4:-7]
-                    new = "S_%s" % core
-
-            # 4) to Valve (HL2/TF2)?
-            elif target_format in ('HL2', 'TF2') and do_null_swing:
-                # SSBU-style null → bump off SWG parent and lookup swing
-                if orig.startswith("S_") and orig.endswith("_null"):
-                    p = bone.parent
-                    if p and p.name.startswith("SWG_") and p.name.endswith("__swing"):
-                        core = p.name[4:-7]
-                        m = DIGITS.match(core)
-                        if m:
-                            pre, num = m.groups()
-                            core = pre + str(int(num) + 1)
-                        swing_name = "SWG_%s__swing" % core
-                    else:
-                        core = orig[2:-5]
-                        swing_name = "SWG_%s__swing" % core
-                    new = bone_map.get(swing_name)
-
-                # SSB4-style null → bump off S_ parent and lookup null
-                elif orig.startswith("SWG_") and orig.endswith("__shit"):
-                    p = bone.parent
-                    if p and p.name.startswith("S_"):
-                        core = p.name[2:]
-                        if core.endswith("_null"):
-                            core = core[:-5]
-                        m = DIGITS.match(core)
-                        if m:
-                            pre, num = m.groups()
-                            core = pre + str(int(num) + 1)
-                        null_name = "S_%s_null" % core
-                    else:
-                        core = orig[4:-6]
-                        null_name = "S_%s_null" % core
-                    new = bone_map.get(null_name)
-
-            # 5) fallback swing
-            if not new and do_swing and orig.startswith("S_"):
-                core = orig[2:]
-                new = bone_map.get("SWG_%s__swing" % core)
-
-        # Apply rename
+    for bone, (orig, _), new in zip(bones, entries, new_names):
         if new and new != orig:
             bone.name = new
             renamed += 1
@@ -335,8 +427,7 @@ class SSB_OT_ConvertToSSBU(bpy.types.Operator):
             self.report({'ERROR'}, "No armature selected!")
             return {'CANCELLED'}
 
-        arm_key = obj.as_pointer()
-        if arm_key in ORIGINAL_BONE_DATA and not self.force:
+        if ULTI_CONVERTED_PROP in obj and not self.force:
             return context.window_manager.invoke_props_dialog(self, width=490)
 
         return self.execute(context)
@@ -447,16 +538,18 @@ class SSB_OT_ConvertToSSB4(bpy.types.Operator):
         layout.label(text="smash-ultimate-blender conversion is active on this armature!  Rename anyway?", icon="ERROR")
 
     def invoke(self, context, event):
-        obj = context.scene.objects.active
-        # If smash-ultimate-blender conversion active, show a wider props dialog
-        if obj and obj.as_pointer() in ORIGINAL_BONE_DATA:
-            return context.window_manager.invoke_props_dialog(self, width=490)
         if not context.scene.ssb4_character:
             context.scene.ssb4_character = "Common"
         self.character = context.scene.ssb4_character
+
+        obj = context.scene.objects.active
         if not obj or obj.type != 'ARMATURE':
             self.report({'ERROR'}, "No armature selected!")
             return {'CANCELLED'}
+
+        # If smash-ultimate-blender conversion active, show a wider props dialog
+        if ULTI_CONVERTED_PROP in obj:
+            return context.window_manager.invoke_props_dialog(self, width=490)
         return self.execute(context)
 
     def execute(self, context):
@@ -477,6 +570,94 @@ class SSB_OT_ConvertToSSB4(bpy.types.Operator):
 # ------------------------------------------------------------
 # Operator: Rename to Valve (HL2 or TF2)
 # ------------------------------------------------------------
+def qc_column_width(names):
+    """Column to pad QC bone names to: the longest name plus three spaces."""
+    return max(map(len, names)) + 3
+
+# Bone/parent pairs re-parented in the QC script, in output order
+LEG_SETS = (
+    ('LLegJ', 'HipN'), ('RLegJ', 'HipN'),
+    ('LegL', 'Hip'), ('LegR', 'Hip'),
+    ('bip_hip_L', 'bip_pelvis'), ('bip_hip_R', 'bip_pelvis'),
+    ('ValveBiped.Bip01_L_Thigh', 'ValveBiped.Bip01_Pelvis'),
+    ('ValveBiped.Bip01_R_Thigh', 'ValveBiped.Bip01_Pelvis'),
+)
+
+SHOULDER_SETS = (
+    ('LShoulderN', 'BustN'), ('RShoulderN', 'BustN'),
+    ('ClavicleL', 'Bust'), ('ClavicleR', 'Bust'),
+    ('bip_collar_L', 'bip_spine_1'), ('bip_collar_R', 'bip_spine_1'),
+    ('ValveBiped.Bip01_L_Clavicle', 'ValveBiped.Bip01_Spine1'),
+    ('ValveBiped.Bip01_R_Clavicle', 'ValveBiped.Bip01_Spine1'),
+)
+
+# Finger bones and the hand they are re-parented to
+HAND_MAP = (
+    ('LIndex1N','LHandN'),('LThumb1N','LHandN'),
+    ('LMiddle1N','LHandN'),('LRing1N','LHandN'),('LPinky1N','LHandN'),
+    ('RIndex1N','RHandN'),('RThumb1N','RHandN'),
+    ('RMiddle1N','RHandN'),('RRing1N','RHandN'),('RPinky1N','RHandN'),
+    ('FingerL11','HandL'),('FingerL51','HandL'),
+    ('FingerL21','HandL'),('FingerL31','HandL'),('FingerL41','HandL'),
+    ('FingerR11','HandR'),('FingerR51','HandR'),
+    ('FingerR21','HandR'),('FingerR31','HandR'),('FingerR41','HandR'),
+    ('bip_index_0_L','bip_hand_L'),('bip_middle_0_L','bip_hand_L'),
+    ('bip_ring_0_L','bip_hand_L'),('bip_pinky_0_L','bip_hand_L'),('bip_thumb_0_L','bip_hand_L'),
+    ('bip_index_0_R','bip_hand_R'),('bip_middle_0_R','bip_hand_R'),
+    ('bip_ring_0_R','bip_hand_R'),('bip_pinky_0_R','bip_hand_R'),('bip_thumb_0_R','bip_hand_R'),
+    ('ValveBiped.Bip01_L_Finger1','ValveBiped.Bip01_L_Hand'),
+    ('ValveBiped.Bip01_L_Finger0','ValveBiped.Bip01_L_Hand'),
+    ('ValveBiped.Bip01_L_Finger2','ValveBiped.Bip01_L_Hand'),
+    ('ValveBiped.Bip01_L_Finger3','ValveBiped.Bip01_L_Hand'),
+    ('ValveBiped.Bip01_L_Finger4','ValveBiped.Bip01_L_Hand'),
+    ('ValveBiped.Bip01_R_Finger1','ValveBiped.Bip01_R_Hand'),
+    ('ValveBiped.Bip01_R_Finger0','ValveBiped.Bip01_R_Hand'),
+    ('ValveBiped.Bip01_R_Finger2','ValveBiped.Bip01_R_Hand'),
+    ('ValveBiped.Bip01_R_Finger3','ValveBiped.Bip01_R_Hand'),
+    ('ValveBiped.Bip01_R_Finger4','ValveBiped.Bip01_R_Hand'),
+)
+
+# Finger bones and the carpal root they collapse into
+COLLAPSE_MAP = {
+    'LIndex1N':'LFingerBaseN','LThumb1N':'LFingerBaseN',
+    'LMiddle1N':'LMiddleN','LRing1N':'LRingN','LPinky1N':'LPinkyN',
+    'RIndex1N':'RFingerBaseN','RThumb1N':'RFingerBaseN',
+    'RMiddle1N':'RMiddleN','RRing1N':'RRingN','RPinky1N':'RPinkyN',
+    'FingerL11':'FingerL10','FingerL51':'FingerL10',
+    'FingerL21':'FingerL20','FingerL31':'FingerL30','FingerL41':'FingerL40',
+    'FingerR11':'FingerR10','FingerR51':'FingerR10',
+    'FingerR21':'FingerR20','FingerR31':'FingerR30','FingerR41':'FingerR40',
+    'bip_index_0_L':'bip_index_carpal_L','bip_middle_0_L':'bip_middle_carpal_L',
+    'bip_ring_0_L':'bip_ring_carpal_L','bip_pinky_0_L':'bip_pinky_carpal_L',
+    'bip_thumb_0_L':'bip_index_carpal_L','bip_index_0_R':'bip_index_carpal_R',
+    'bip_middle_0_R':'bip_middle_carpal_R','bip_ring_0_R':'bip_ring_carpal_R',
+    'bip_pinky_0_R':'bip_pinky_carpal_R','bip_thumb_0_R':'bip_index_carpal_R',
+    'ValveBiped.Bip01_L_Finger1':'ValveBiped.Bip01_L_Finger1_Carpal',
+    'ValveBiped.Bip01_L_Finger2':'ValveBiped.Bip01_L_Finger2_Carpal',
+    'ValveBiped.Bip01_L_Finger3':'ValveBiped.Bip01_L_Finger3_Carpal',
+    'ValveBiped.Bip01_L_Finger4':'ValveBiped.Bip01_L_Finger4_Carpal',
+    'ValveBiped.Bip01_L_Finger0':'ValveBiped.Bip01_L_Finger1_Carpal',
+    'ValveBiped.Bip01_R_Finger1':'ValveBiped.Bip01_R_Finger1_Carpal',
+    'ValveBiped.Bip01_R_Finger2':'ValveBiped.Bip01_R_Finger2_Carpal',
+    'ValveBiped.Bip01_R_Finger3':'ValveBiped.Bip01_R_Finger3_Carpal',
+    'ValveBiped.Bip01_R_Finger4':'ValveBiped.Bip01_R_Finger4_Carpal',
+    'ValveBiped.Bip01_R_Finger0':'ValveBiped.Bip01_R_Finger1_Carpal',
+}
+
+# Carpal finger roots collapsed in the QC script, in output order
+CANDIDATE_FINGER_ROOTS = (
+    'LFingerBaseN','LMiddleN','LRingN','LPinkyN',
+    'RFingerBaseN','RMiddleN','RRingN','RPinkyN',
+    'FingerL10','FingerL20','FingerL30','FingerL40',
+    'FingerR10','FingerR20','FingerR30','FingerR40',
+    'bip_index_carpal_L','bip_middle_carpal_L','bip_ring_carpal_L','bip_pinky_carpal_L',
+    'bip_index_carpal_R','bip_middle_carpal_R','bip_ring_carpal_R','bip_pinky_carpal_R',
+    'ValveBiped.Bip01_L_Finger1_Carpal','ValveBiped.Bip01_L_Finger2_Carpal',
+    'ValveBiped.Bip01_L_Finger3_Carpal','ValveBiped.Bip01_L_Finger4_Carpal',
+    'ValveBiped.Bip01_R_Finger1_Carpal','ValveBiped.Bip01_R_Finger2_Carpal',
+    'ValveBiped.Bip01_R_Finger3_Carpal','ValveBiped.Bip01_R_Finger4_Carpal',
+)
+
 class SSB_OT_ConvertToValve(bpy.types.Operator):
     bl_idname = 'ssb4.convert_to_valve'
     bl_label = 'Convert to Valve'
@@ -497,8 +678,6 @@ class SSB_OT_ConvertToValve(bpy.types.Operator):
         arm = obj.data
         bones = get_target_bones(arm)
 
-        bone_names = get_bone_name_set(bones)
-
         # Rename bones mode
         if not prefs.convert_to_valve_script:
             ok, count, _ = rename_bones(
@@ -522,6 +701,8 @@ class SSB_OT_ConvertToValve(bpy.types.Operator):
         txt.clear()
 
         separator = "//----------------------------------------------\n"
+        # Every section is appended here and written to the text block in one go at the end
+        out = []
 
         # Buffers for conditional QC sections
         opt_lines = []
@@ -541,27 +722,20 @@ class SSB_OT_ConvertToValve(bpy.types.Operator):
         old_root_names = ['Trans', 'Throw', 'Rot', 'TransN', 'ThrowN', 'RotN']
         old_roots = [r for r in old_root_names if r in names]
         if old_roots:
-            max_len = max(len(r) for r in old_roots)
+            col = qc_column_width(old_roots)
             opt_lines.append("// Collapse old roots\n")
             for r in old_roots:
-                opt_lines.append("$alwayscollapse %s%s\n" % (r, ' ' * (max_len - len(r) + 3)))
+                opt_lines.append("$alwayscollapse " + r.ljust(col) + "\n")
             opt_lines.append("\n")
 
         # 4) Reorganize leg hierarchy
-        leg_sets = [
-            ('LLegJ', 'HipN'), ('RLegJ', 'HipN'),
-            ('LegL', 'Hip'), ('LegR', 'Hip'),
-            ('bip_hip_L', 'bip_pelvis'), ('bip_hip_R', 'bip_pelvis'),
-            ('ValveBiped.Bip01_L_Thigh', 'ValveBiped.Bip01_Pelvis'),
-            ('ValveBiped.Bip01_R_Thigh', 'ValveBiped.Bip01_Pelvis'),
-        ]
-        leg_pairs = [(b, p) for (b, p) in leg_sets if b in names and p in names]
+        leg_pairs = [(b, p) for (b, p) in LEG_SETS if b in names and p in names]
         if leg_pairs:
             leg_lines.append(separator + "\n")
             leg_lines.append("// Reorganize leg hierarchy\n")
-            max_len = max(len(b) for b, p in leg_pairs)
+            col = qc_column_width(b for b, p in leg_pairs)
             for b, p in leg_pairs:
-                leg_lines.append("$hierarchy %s%s%s\n" % (b, ' ' * (max_len - len(b) + 3), p))
+                leg_lines.append("$hierarchy " + b.ljust(col) + p + "\n")
             leg_lines.append("\n")
             for leg_c in ('CLegJ', 'LegC', 'bip_hip_C', 'ValveBiped.Bip01_C_Thigh'):
                 if leg_c in names:
@@ -570,20 +744,13 @@ class SSB_OT_ConvertToValve(bpy.types.Operator):
                     break
 
         # 5) Reorganize shoulder hierarchy
-        shoulder_sets = [
-            ('LShoulderN', 'BustN'), ('RShoulderN', 'BustN'),
-            ('ClavicleL', 'Bust'), ('ClavicleR', 'Bust'),
-            ('bip_collar_L', 'bip_spine_1'), ('bip_collar_R', 'bip_spine_1'),
-            ('ValveBiped.Bip01_L_Clavicle', 'ValveBiped.Bip01_Spine1'),
-            ('ValveBiped.Bip01_R_Clavicle', 'ValveBiped.Bip01_Spine1'),
-        ]
-        shoulder_pairs = [(b, p) for (b, p) in shoulder_sets if b in names and p in names]
+        shoulder_pairs = [(b, p) for (b, p) in SHOULDER_SETS if b in names and p in names]
         if shoulder_pairs:
             shoulder_lines.append(separator + "\n")
             shoulder_lines.append("// Reorganize shoulder hierarchy\n")
-            max_len = max(len(b) for b, p in shoulder_pairs)
+            col = qc_column_width(b for b, p in shoulder_pairs)
             for b, p in shoulder_pairs:
-                shoulder_lines.append("$hierarchy %s%s%s\n" % (b, ' ' * (max_len - len(b) + 3), p))
+                shoulder_lines.append("$hierarchy " + b.ljust(col) + p + "\n")
             shoulder_lines.append("\n")
             for root in ('CShoulderN', 'ClavicleC', 'bip_spine_2', 'ValveBiped.Bip01_Spine2'):
                 if root in names:
@@ -592,145 +759,92 @@ class SSB_OT_ConvertToValve(bpy.types.Operator):
                     break
 
         # 6) Reorganize hand + Collapse carpal finger bones
-        finger_roots = [
-            f for f in [
-                'LFingerBaseN','LMiddleN','LRingN','LPinkyN',
-                'RFingerBaseN','RMiddleN','RRingN','RPinkyN',
-                'FingerL10','FingerL20','FingerL30','FingerL40',
-                'FingerR10','FingerR20','FingerR30','FingerR40',
-                'bip_index_carpal_L','bip_middle_carpal_L','bip_ring_carpal_L','bip_pinky_carpal_L',
-                'bip_index_carpal_R','bip_middle_carpal_R','bip_ring_carpal_R','bip_pinky_carpal_R',
-                'ValveBiped.Bip01_L_Finger1_Carpal','ValveBiped.Bip01_L_Finger2_Carpal',
-                'ValveBiped.Bip01_L_Finger3_Carpal','ValveBiped.Bip01_L_Finger4_Carpal',
-                'ValveBiped.Bip01_R_Finger1_Carpal','ValveBiped.Bip01_R_Finger2_Carpal',
-                'ValveBiped.Bip01_R_Finger3_Carpal','ValveBiped.Bip01_R_Finger4_Carpal'
-            ] if f in names
-        ]
+        finger_roots = [f for f in CANDIDATE_FINGER_ROOTS if f in names]
+        finger_roots_set = set(finger_roots)
 
-        collapse_map = {
-            'LIndex1N':'LFingerBaseN','LThumb1N':'LFingerBaseN',
-            'LMiddle1N':'LMiddleN','LRing1N':'LRingN','LPinky1N':'LPinkyN',
-            'RIndex1N':'RFingerBaseN','RThumb1N':'RFingerBaseN',
-            'RMiddle1N':'RMiddleN','RRing1N':'RRingN','RPinky1N':'RPinkyN',
-            'FingerL11':'FingerL10','FingerL51':'FingerL10',
-            'FingerL21':'FingerL20','FingerL31':'FingerL30','FingerL41':'FingerL40',
-            'FingerR11':'FingerR10','FingerR51':'FingerR10',
-            'FingerR21':'FingerR20','FingerR31':'FingerR30','FingerR41':'FingerR40',
-            'bip_index_0_L':'bip_index_carpal_L','bip_middle_0_L':'bip_middle_carpal_L',
-            'bip_ring_0_L':'bip_ring_carpal_L','bip_pinky_0_L':'bip_pinky_carpal_L',
-            'bip_thumb_0_L':'bip_index_carpal_L','bip_index_0_R':'bip_index_carpal_R',
-            'bip_middle_0_R':'bip_middle_carpal_R','bip_ring_0_R':'bip_ring_carpal_R',
-            'bip_pinky_0_R':'bip_pinky_carpal_R','bip_thumb_0_R':'bip_index_carpal_R',
-            'ValveBiped.Bip01_L_Finger1':'ValveBiped.Bip01_L_Finger1_Carpal',
-            'ValveBiped.Bip01_L_Finger2':'ValveBiped.Bip01_L_Finger2_Carpal',
-            'ValveBiped.Bip01_L_Finger3':'ValveBiped.Bip01_L_Finger3_Carpal',
-            'ValveBiped.Bip01_L_Finger4':'ValveBiped.Bip01_L_Finger4_Carpal',
-            'ValveBiped.Bip01_L_Finger0':'ValveBiped.Bip01_L_Finger1_Carpal',
-            'ValveBiped.Bip01_R_Finger1':'ValveBiped.Bip01_R_Finger1_Carpal',
-            'ValveBiped.Bip01_R_Finger2':'ValveBiped.Bip01_R_Finger2_Carpal',
-            'ValveBiped.Bip01_R_Finger3':'ValveBiped.Bip01_R_Finger3_Carpal',
-            'ValveBiped.Bip01_R_Finger4':'ValveBiped.Bip01_R_Finger4_Carpal',
-            'ValveBiped.Bip01_R_Finger0':'ValveBiped.Bip01_R_Finger1_Carpal',
-        }
-
-        hand_map = [
-            ('LIndex1N','LHandN'),('LThumb1N','LHandN'),
-            ('LMiddle1N','LHandN'),('LRing1N','LHandN'),('LPinky1N','LHandN'),
-            ('RIndex1N','RHandN'),('RThumb1N','RHandN'),
-            ('RMiddle1N','RHandN'),('RRing1N','RHandN'),('RPinky1N','RHandN'),
-            ('FingerL11','HandL'),('FingerL51','HandL'),
-            ('FingerL21','HandL'),('FingerL31','HandL'),('FingerL41','HandL'),
-            ('FingerR11','HandR'),('FingerR51','HandR'),
-            ('FingerR21','HandR'),('FingerR31','HandR'),('FingerR41','HandR'),
-            ('bip_index_0_L','bip_hand_L'),('bip_middle_0_L','bip_hand_L'),
-            ('bip_ring_0_L','bip_hand_L'),('bip_pinky_0_L','bip_hand_L'),('bip_thumb_0_L','bip_hand_L'),
-            ('bip_index_0_R','bip_hand_R'),('bip_middle_0_R','bip_hand_R'),
-            ('bip_ring_0_R','bip_hand_R'),('bip_pinky_0_R','bip_hand_R'),('bip_thumb_0_R','bip_hand_R'),
-            ('ValveBiped.Bip01_L_Finger1','ValveBiped.Bip01_L_Hand'),
-            ('ValveBiped.Bip01_L_Finger0','ValveBiped.Bip01_L_Hand'),
-            ('ValveBiped.Bip01_L_Finger2','ValveBiped.Bip01_L_Hand'),
-            ('ValveBiped.Bip01_L_Finger3','ValveBiped.Bip01_L_Hand'),
-            ('ValveBiped.Bip01_L_Finger4','ValveBiped.Bip01_L_Hand'),
-            ('ValveBiped.Bip01_R_Finger1','ValveBiped.Bip01_R_Hand'),
-            ('ValveBiped.Bip01_R_Finger0','ValveBiped.Bip01_R_Hand'),
-            ('ValveBiped.Bip01_R_Finger2','ValveBiped.Bip01_R_Hand'),
-            ('ValveBiped.Bip01_R_Finger3','ValveBiped.Bip01_R_Hand'),
-            ('ValveBiped.Bip01_R_Finger4','ValveBiped.Bip01_R_Hand'),
-        ]
         valid_hand_map = [
-            (b, p) for b, p in hand_map
-            if b in names and p in names and collapse_map.get(b) in finger_roots
+            (b, p) for b, p in HAND_MAP
+            if b in names and p in names and COLLAPSE_MAP.get(b) in finger_roots_set
         ]
         if valid_hand_map:
             hand_lines.append(separator + "\n")
             hand_lines.append("// Reorganize hand hierarchy\n")
-            max_len = max(len(b) for b, p in valid_hand_map)
+            col = qc_column_width(b for b, p in valid_hand_map)
             for b, p in valid_hand_map:
-                hand_lines.append("$hierarchy %s%s%s\n" % (b, ' ' * (max_len - len(b) + 3), p))
+                hand_lines.append("$hierarchy " + b.ljust(col) + p + "\n")
             hand_lines.append("\n")
 
         if finger_roots:
             hand_lines.append("// Collapse carpal finger bones\n")
-            max_len = max(len(f) for f in finger_roots)
+            col = qc_column_width(finger_roots)
             for f in finger_roots:
-                hand_lines.append("$alwayscollapse %s%s\n" % (f, ' ' * (max_len - len(f) + 3)))
+                hand_lines.append("$alwayscollapse " + f.ljust(col) + "\n")
             hand_lines.append("\n")
 
         # Write OPTIONAL OPTIMIZATIONS if any of the 4 sections are non-empty
         if opt_lines or leg_lines or shoulder_lines or hand_lines:
-            txt.write(separator)
-            txt.write("// OPTIONAL OPTIMIZATIONS (state at the top in this order, should not break animations)\n")
-            txt.write(separator + "\n")
-            for line in opt_lines + leg_lines + shoulder_lines + hand_lines:
-                txt.write(line)
+            out.append(separator)
+            out.append("// OPTIONAL OPTIMIZATIONS (state at the top in this order, should not break animations)\n")
+            out.append(separator + "\n")
+            out += opt_lines
+            out += leg_lines
+            out += shoulder_lines
+            out += hand_lines
 
         # 7) $bonemerge section
-        bonemerge_lines = ["$bonemerge %s\n" % b.name for b in bones if not b.children]
+        bonemerge_lines = ["$bonemerge " + b.name + "\n" for b in bones if not b.children]
         if bonemerge_lines:
-            txt.write(separator)
-            txt.write("// BONEMERGE (all leaf bones, prevents removal during compile)\n")
-            txt.write(separator + "\n")
-            for line in bonemerge_lines:
-                txt.write(line)
-            txt.write("\n")
+            out.append(separator)
+            out.append("// BONEMERGE (all leaf bones, prevents removal during compile)\n")
+            out.append(separator + "\n")
+            out += bonemerge_lines
+            out.append("\n")
 
         # 8) $renamebone section, grouped & aligned using Blender bone groups
-        from .bonemaps import CHARACTER_BONE_MAPS
-        common_clav, common_leg, common_list = CHARACTER_BONE_MAPS["Common"]
-        char_clav,   char_leg,   char_list   = CHARACTER_BONE_MAPS[scene.ssb4_character]
-        all_maps = common_list + char_list
-
-        bone_map = build_bone_map(all_maps, fmt_i)
-
-        pairs = [
-            (b.name, bone_map[b.name]) for b in bones
-            if bone_map.get(b.name) and b.name != bone_map[b.name]
-        ]
-
-        if pairs:
-            max_len = max(len(o) for o, _ in pairs)
-            group_dict = {}
-            for old,new in pairs:
-                pb = obj.pose.bones.get(old)
-                group = pb.bone_group.name if pb and pb.bone_group else "<No Group>"
-                group_dict.setdefault(group, []).append((old,new))
-
-            txt.write(separator)
-            txt.write("// RENAME BONES (by bone groups)\n")
-            txt.write(separator + "\n")
-            for group in obj.pose.bone_groups:
-                entries = group_dict.get(group.name, [])
+        bone_map = get_bone_map(scene.ssb4_character, fmt)
+
+        # Bone group of every pose bone, read in one walk instead of a keyed RNA lookup per bone
+        bone_group_of = {}
+        for pb in obj.pose.bones:
+            bone_group = pb.bone_group
+            if bone_group:
+                bone_group_of[pb.name] = bone_group.name
+
+        # One pass: map each bone, track the widest old name and bucket by bone group
+        max_len = 0
+        group_dict = {}
+        for b in bones:
+            old = b.name
+            new = bone_map.get(old)
+            if not new or new == old:
+                continue
+            if len(old) > max_len:
+                max_len = len(old)
+            group = bone_group_of.get(old, "<No Group>")
+            group_dict.setdefault(group, []).append((old,new))
+
+        if group_dict:
+            col = max_len + 3
+            out.append(separator)
+            out.append("// RENAME BONES (by bone groups)\n")
+            out.append(separator + "\n")
+            # Group names in panel order, read in one walk of the collection
+            ordered_groups = [g.name for g in obj.pose.bone_groups]
+            for group_name in ordered_groups:
+                entries = group_dict.get(group_name)
                 if not entries:
                     continue
-                txt.write("// %s\n" % group.name)
-                for o,nw in sorted(entries):
-                    txt.write("$renamebone %s%s%s\n" % (o, ' ' * (max_len - len(o) + 3), nw))
-                txt.write("\n")
+                out.append("// " + group_name + "\n")
+                for o,nw in sorted(entries, key=itemgetter(0)):
+                    out.append("$renamebone " + o.ljust(col) + nw + "\n")
+                out.append("\n")
             if "<No Group>" in group_dict:
-                txt.write("// Ungrouped\n")
-                for o,nw in sorted(group_dict["<No Group>"]):
-                    txt.write("$renamebone %s%s%s\n" % (o, ' ' * (max_len - len(o) + 3), nw))
-                txt.write("\n")
+                out.append("// Ungrouped\n")
+                for o,nw in sorted(group_dict["<No Group>"], key=itemgetter(0)):
+                    out.append("$renamebone " + o.ljust(col) + nw + "\n")
+                out.append("\n")
+
+        txt.write("".join(out))
 
         # Reveal in Text Editor
         for area in context.screen.areas:
@@ -762,7 +876,7 @@ class SSB_OT_TrimString(bpy.types.Operator):
 
     def invoke(self, context, event):
         obj = context.scene.objects.active
-        if obj and obj.as_pointer() in ORIGINAL_BONE_DATA:
+        if obj and ULTI_CONVERTED_PROP in obj:
             return context.window_manager.invoke_props_dialog(self, width=470)
         return self.execute(context)
 
@@ -808,7 +922,7 @@ class SSB_OT_FindReplaceBones(bpy.types.Operator):
     def invoke(self, context, event):
         obj = context.scene.objects.active
         # If smash-ultimate-blender conversion is active, show a warning
-        if obj and obj.as_pointer() in ORIGINAL_BONE_DATA:
+        if obj and ULTI_CONVERTED_PROP in obj:
             return context.window_manager.invoke_props_dialog(self, width=490)
         return self.execute(context)
 
@@ -848,8 +962,11 @@ class SSB_OT_StripNuanmxFromActions(bpy.types.Operator):
     def execute(self, context):
         count = 0
         for action in bpy.data.actions:
-            if ".nuanmx" in action.name:
-                action.name = action.name.replace(".nuanmx", "")
+            # replace() hands back the same string when there is nothing to strip, so != is cheap
+            old = action.name
+            new = old.replace(".nuanmx", "")
+            if new != old:
+                action.name = new
                 count += 1
         self.report({'INFO'}, "Stripped '.nuanmx' from {} actions.".format(count))
         return {'FINISHED'}
@@ -894,8 +1011,7 @@ class SSB_OT_Rotate90(bpy.types.Operator):
         
         # STEP 3: Rotate the duplicate 90° on the global X axis from the world origin.
         # To rotate about the world origin, pre-multiply the duplicate's matrix_world.
-        R = Matrix.Rotation(math.radians(90), 4, 'X')
-        dup_obj.matrix_world = R * dup_obj.matrix_world
+        dup_obj.matrix_world = ROT_X_POS90 * dup_obj.matrix_world
         self.report({'INFO'}, "Step 3: Rotated duplicate '%s' 90° on global X" % dup_obj.name)
         
         # STEP 4: Bake the original armature's action using visual keying.
@@ -998,9 +1114,12 @@ class SSB_OT_PoseBoneTransforms(bpy.types.Operator):
 
     def clear_constraints(self, bones, source_armature):
         for bone in bones:
-            for c in [c for c in bone.constraints
-                      if c.type.startswith('COPY_') and c.target == source_armature]:
-                bone.constraints.remove(c)
+            # Walk backwards so removals don't shift the constraints still to be checked
+            constraints = bone.constraints
+            for i in range(len(constraints) - 1, -1, -1):
+                c = constraints[i]
+                if c.type.startswith('COPY_') and c.target == source_armature:
+                    constraints.remove(c)
 
     def execute(self, context):
         target = self.get_target_armature(context)
@@ -1009,27 +1128,35 @@ class SSB_OT_PoseBoneTransforms(bpy.types.Operator):
             return {'CANCELLED'}
 
         source = bpy.data.objects[self.source_armature]
+        # Materialized once: the bones are walked up to three times below
         bones = (
             [b for b in target.pose.bones if b.bone.select]
-            if self.only_selected else target.pose.bones)
+            if self.only_selected else list(target.pose.bones))
 
         if self.clear_previous:
             self.clear_constraints(bones, source)
 
+        # Interned names: matching lookups then resolve on identity instead of comparing characters
+        tgt_by_name = {sys.intern(b.name): b for b in bones}
         for src_bone in source.pose.bones:
-            for tgt_bone in bones:
-                if src_bone.name == tgt_bone.name:
-                    # remove any existing matching constraint
-                    for c in [c for c in tgt_bone.constraints
-                              if c.type == self.constraint_type and c.target == source]:
-                        tgt_bone.constraints.remove(c)
-                    # add new copy constraint
-                    c = tgt_bone.constraints.new(self.constraint_type)
-                    c.target = source
-                    c.subtarget = src_bone.name
+            name = sys.intern(src_bone.name)
+            tgt_bone = tgt_by_name.get(name)
+            if tgt_bone is None:
+                continue
+            # remove the existing matching constraint (this operator only ever adds one)
+            for c in tgt_bone.constraints:
+                if c.type == self.constraint_type and c.target == source:
+                    tgt_bone.constraints.remove(c)
+                    break
+            # add new copy constraint
+            c = tgt_bone.constraints.new(self.constraint_type)
+            c.target = source
+            c.subtarget = name
 
         if self.apply_visual_transform:
-            bpy.ops.pose.select_all(action='SELECT')
+            # With Only Selected the current selection is already exactly the constrained bones
+            if not self.only_selected:
+                bpy.ops.pose.select_all(action='SELECT')
             bpy.ops.pose.visual_transform_apply()
             self.clear_constraints(bones, source)
             self.report({'INFO'}, "Visual transforms applied; constraints removed.")
@@ -1051,7 +1178,23 @@ class SSB_OT_PoseBoneTransforms(bpy.types.Operator):
 # Operator for Locking the Hip on Z axis
 # ------------------------------------------------------------
 
+# Kept ordered: the first name present on the armature is the hip that gets locked
 VALID_HIP_NAMES = ("HipN", "Hip", "bip_pelvis", "ValveBiped.Bip01_Pelvis", "Bip01_Pelvis", "Pelvis")
+HIP_LOCK_NAME = "Hip Z Axis Lock"
+
+def find_hip_bone(obj):
+    """Return the pose bone of the preferred hip on an armature object, or None."""
+    pose_bones = obj.pose.bones
+    for candidate in VALID_HIP_NAMES:
+        pbone = pose_bones.get(candidate)
+        if pbone is not None:
+            return pbone
+    return None
+
+def is_hip_locked(obj):
+    """Return True if the armature's hip bone carries the hip lock constraint."""
+    pbone = find_hip_bone(obj)
+    return pbone is not None and HIP_LOCK_NAME in pbone.constraints
 
 class SSB_OT_LockHip(bpy.types.Operator):
     bl_idname = "ssb4.lock_hip"
@@ -1064,13 +1207,7 @@ class SSB_OT_LockHip(bpy.types.Operator):
         if not obj or obj.type != 'ARMATURE':
             return False
         # Check for existing constraint
-        for candidate in VALID_HIP_NAMES:
-            if candidate in obj.pose.bones:
-                pbone = obj.pose.bones[candidate]
-                for c in pbone.constraints:
-                    if c.name == "Hip Z Axis Lock":
-                        return False
-        return True
+        return not is_hip_locked(obj)
 
     def execute(self, context):
         obj = context.scene.objects.active
@@ -1079,29 +1216,17 @@ class SSB_OT_LockHip(bpy.types.Operator):
             return {'CANCELLED'}
 
         # Determine which hip bone is available; prefer "HipN", then "Hip"
-        hip_bone_name = None
-        for candidate in VALID_HIP_NAMES:
-            if candidate in obj.data.bones:
-                hip_bone_name = candidate
-                break
-
-        if not hip_bone_name:
+        pbone = find_hip_bone(obj)
+        if pbone is None:
             self.report({'ERROR'}, "No hip bone (HipN/Hip) found!")
             return {'CANCELLED'}
-
-        # Get the pose bone
-        try:
-            pbone = obj.pose.bones[hip_bone_name]
-        except KeyError:
-            self.report({'ERROR'}, "No pose bone for '%s'" % hip_bone_name)
-            return {'CANCELLED'}
+        hip_bone_name = pbone.name
 
         # --- Remove any existing hip lock first ---
         # Remove constraint if present
-        for constr in pbone.constraints:
-            if constr.name == "Hip Z Axis Lock":
-                pbone.constraints.remove(constr)
-                break
+        constr = pbone.constraints.get(HIP_LOCK_NAME)
+        if constr is not None:
+            pbone.constraints.remove(constr)
 
         # Delete the existing empty if it exists
         empty_name = "Lock_" + hip_bone_name
@@ -1127,7 +1252,7 @@ class SSB_OT_LockHip(bpy.types.Operator):
 
         # Add a Copy Location constraint to the pose bone that only affects the Z axis in world space
         constr = pbone.constraints.new('COPY_LOCATION')
-        constr.name = "Hip Z Axis Lock"
+        constr.name = HIP_LOCK_NAME
         constr.target = empty
         constr.use_x = False
         constr.use_y = False
@@ -1145,13 +1270,8 @@ class SSB_OT_LockHip(bpy.types.Operator):
             return {'CANCELLED'}
 
         # Clear existing lock only if it's active
-        for candidate in VALID_HIP_NAMES:
-            if candidate in obj.pose.bones:
-                pbone = obj.pose.bones[candidate]
-                for c in pbone.constraints:
-                    if c.name == "Hip Z Axis Lock":
-                        bpy.ops.ssb4.unlock_hip('EXEC_DEFAULT')
-                        break
+        if is_hip_locked(obj):
+            bpy.ops.ssb4.unlock_hip('EXEC_DEFAULT')
         return self.execute(context)
 
 class SSB_OT_UnlockHip(bpy.types.Operator):
@@ -1164,13 +1284,7 @@ class SSB_OT_UnlockHip(bpy.types.Operator):
         obj = context.scene.objects.active
         if not obj or obj.type != 'ARMATURE':
             return False
-        for candidate in VALID_HIP_NAMES:
-            if candidate in obj.pose.bones:
-                pbone = obj.pose.bones[candidate]
-                for c in pbone.constraints:
-                    if c.name == "Hip Z Axis Lock":
-                        return True
-        return False
+        return is_hip_locked(obj)
 
     def execute(self, context):
         obj = context.scene.objects.active
@@ -1179,27 +1293,16 @@ class SSB_OT_UnlockHip(bpy.types.Operator):
             return {'CANCELLED'}
         
         # Determine which hip bone is available; prefer "HipN", then "Hip"
-        hip_bone_name = None
-        for candidate in VALID_HIP_NAMES:
-            if candidate in obj.data.bones:
-                hip_bone_name = candidate
-                break
-        if not hip_bone_name:
+        pbone = find_hip_bone(obj)
+        if pbone is None:
             self.report({'ERROR'}, "No hip bone (HipN/Hip) found!")
             return {'CANCELLED'}
-        
-        # Get the pose bone
-        try:
-            pbone = obj.pose.bones[hip_bone_name]
-        except KeyError:
-            self.report({'ERROR'}, "No pose bone for '%s'" % hip_bone_name)
-            return {'CANCELLED'}
+        hip_bone_name = pbone.name
         
         # Remove the constraint named "Hip Z Axis Lock" if it exists
-        for constr in pbone.constraints:
-            if constr.name == "Hip Z Axis Lock":
-                pbone.constraints.remove(constr)
-                break
+        constr = pbone.constraints.get(HIP_LOCK_NAME)
+        if constr is not None:
+            pbone.constraints.remove(constr)
         
         # Look for an object (empty) named "HipLock_<hip_bone_name>" and delete it
         empty_name = "Lock_" + hip_bone_name
@@ -1215,6 +1318,10 @@ class SSB_OT_UnlockHip(bpy.types.Operator):
 # ------------------------------------------------------------
 # Operator for Clearing Location Keyframes and Resetting Location
 # ------------------------------------------------------------
+
+# Location fcurve of a pose bone, capturing the bone name
+LOC_FCURVE_RE = re.compile(r'^pose\.bones\["([^"]+)"\]\.location$')
+
 class SSB_OT_ClearLocationKeyframes(bpy.types.Operator):
     """
     Clears location keyframes and resets location for non-immune bones.
@@ -1242,25 +1349,24 @@ class SSB_OT_ClearLocationKeyframes(bpy.types.Operator):
         if not context.scene.ssb4_clear_hip:
             # Hip bone is immune if "Clear Hip" is toggled
             immune.update(VALID_HIP_NAMES)
+        # Bones that get cleared: in scope and not immune
+        clear_names = target_bone_names - immune
 
         # Remove location keyframes
         if obj.animation_data and obj.animation_data.action:
-            action = obj.animation_data.action
-            remove_indices = []
-            for i, fc in enumerate(action.fcurves):
-                if fc.data_path.startswith('pose.bones["') and '.location' in fc.data_path:
-                    try:
-                        bone_name = fc.data_path.split('["')[1].split('"]')[0]
-                    except Exception:
-                        continue
-                    if bone_name in target_bone_names and bone_name not in immune:
-                        remove_indices.append(i)
-            for i in reversed(remove_indices):
-                action.fcurves.remove(action.fcurves[i])
+            fcurves = obj.animation_data.action.fcurves
+            to_remove = []
+            for fc in fcurves:
+                m = LOC_FCURVE_RE.match(fc.data_path)
+                if m and m.group(1) in clear_names:
+                    to_remove.append(fc)
+            # Remove by reference; indexing the collection walks the fcurve list from the start
+            for fc in to_remove:
+                fcurves.remove(fc)
 
         # Zero out location
         for pbone in obj.pose.bones:
-            if pbone.name in target_bone_names and pbone.name not in immune:
+            if pbone.name in clear_names:
                 pbone.location = (0.0, 0.0, 0.0)
 
         self.report({'INFO'}, "Cleared location keyframes and reset location for non-immune bones")
@@ -1270,9 +1376,6 @@ class SSB_OT_ClearLocationKeyframes(bpy.types.Operator):
 # smash-ultimate-blender Bone Simulator
 # ------------------------------------------------------------
 
-# Global dictionary to store original bone lengths per armature.
-ORIGINAL_BONE_DATA = {}
-
 def is_real_ssbu_null(bone):
     """Return True if this bone is a genuine SSBU null-swing (S_*_null whose parent is also S_* but not _null)."""
     name = bone.name
@@ -1285,9 +1388,23 @@ def is_real_ssbu_null(bone):
         not parent.name.endswith("_null")
     )
 
-def are_vectors_close(a: Vector, b: Vector, tol: float = 1e-5) -> bool:
-    """Return True if two vectors are equal within the given absolute tolerance."""
-    return all(math.isclose(a[i], b[i], abs_tol=tol) for i in range(3))
+# SSBU finger base bones, sized to reach the first segment of their finger
+FINGER_BASES = frozenset((
+    "FingerL10", "FingerL20", "FingerL30", "FingerL40",
+    "FingerR10", "FingerR20", "FingerR30", "FingerR40"))
+
+# Limb bones sized to reach the head of the next bone down the limb
+LIMB_TARGETS = {
+    src + side: tgt + side
+    for src, tgt in (("Arm",      "Hand"),
+                     ("Shoulder", "Arm"),
+                     ("Leg",      "Knee"),
+                     ("Knee",     "Foot"))
+    for side in "LR"}
+LIMB_TARGETS["ClavicleC"] = "Neck"
+
+# Squared distance under which two bone heads count as coinciding (1e-5 units apart)
+COINCIDENT_DIST_SQ = 1e-5 ** 2
 
 class SSB_OT_UltiBones(bpy.types.Operator):
     bl_idname = "ssb4.ulti_bones"
@@ -1307,8 +1424,8 @@ class SSB_OT_UltiBones(bpy.types.Operator):
         # Override bypasses the “already converted” check
         if scene.ssb4_override_lock:
             return True
-        # Otherwise only if not already snapshot
-        return obj.as_pointer() not in ORIGINAL_BONE_DATA
+        # Otherwise only if not already converted
+        return ULTI_CONVERTED_PROP not in obj
 
 
     def execute(self, context):
@@ -1329,21 +1446,35 @@ class SSB_OT_UltiBones(bpy.types.Operator):
         arm = obj.data
         edit_bones = arm.edit_bones
 
+        # Bulk-read the coordinates into flat arrays, in edit bone order (same order as 'names')
+        count = len(edit_bones)
+        heads = [0.0] * (count * 3)
+        tails = [0.0] * (count * 3)
+        rolls = [0.0] * count
+        edit_bones.foreach_get("head", heads)
+        edit_bones.foreach_get("tail", tails)
+        edit_bones.foreach_get("roll", rolls)
         ORIGINAL_BONE_DATA[arm_key] = {
-            eb.name: {
-                'head': eb.head.copy(),
-                'tail': eb.tail.copy(),
-                'roll': eb.roll }
-            for eb in edit_bones }
-        # Also remember what scheme to rename back to
-        ORIGINAL_BONE_DATA[arm_key]['last_scheme'] = old_scheme
+            'names': [eb.name for eb in edit_bones],
+            'head': heads,
+            'tail': tails,
+            'roll': rolls,
+            # Also remember what scheme to rename back to
+            'last_scheme': old_scheme }
+        obj[ULTI_CONVERTED_PROP] = 1
 
         # 3) Apply the −90° Z rotation
-        rot_z = Matrix.Rotation(math.radians(-90), 4, 'Z')
         for eb in arm.edit_bones:
-            eb.matrix = eb.matrix * rot_z
+            eb.matrix = eb.matrix * ROT_Z_NEG90
 
         # 4) Adjust lengths per hierarchy, set all bones to a length of 1 by default
+        # EditBone.children scans every bone in the armature, so index names and children up front
+        eb_by_name = {eb.name: eb for eb in edit_bones}
+        children_map = {name: [] for name in eb_by_name}
+        for eb in edit_bones:
+            if eb.parent:
+                children_map[eb.parent.name].append(eb)
+
         for eb in edit_bones:
 
             # # DEBUG: print classification
@@ -1356,20 +1487,21 @@ class SSB_OT_UltiBones(bpy.types.Operator):
 
             eb.length = 1.0
             name = eb.name
-            children = eb.children
+            children = children_map[name]
 
             # Real SSBU null-swing bones and leaf bones always inherit their parent’s length
             if eb.parent and (
                    is_real_ssbu_null(eb)
-                or (len(eb.children) == 0 and not eb.name.endswith("_null"))):
+                or (not children and not name.endswith("_null"))):
                 eb.length = eb.parent.length
                 continue
 
             # Single-child chain → stretch to match child distance (skip if heads coincide)
             if len(children) == 1:
-                child = children[0]
-                if not are_vectors_close(eb.head, child.head):
-                    eb.length = (child.head - eb.head).length
+                offset = children[0].head - eb.head
+                dist_sq = offset.length_squared
+                if dist_sq > COINCIDENT_DIST_SQ:
+                    eb.length = math.sqrt(dist_sq)
                 continue
 
             # Multi-child “_eff” helper → length to that eff-child (should not appear)
@@ -1379,29 +1511,16 @@ class SSB_OT_UltiBones(bpy.types.Operator):
                     break
 
             # Finger base bones → match next segment
-            finger_bases = ["FingerL10","FingerL20","FingerL30","FingerL40",
-                            "FingerR10","FingerR20","FingerR30","FingerR40"]
-            if name in finger_bases:
-                next_bone = edit_bones.get(name[:-1] + "1")
+            if name in FINGER_BASES:
+                next_bone = eb_by_name.get(name[:-1] + "1")
                 if next_bone:
                     eb.length = (next_bone.head - eb.head).length
                     continue
 
             # Special cases for limbs
-            target = None
-            if name == "ClavicleC":
-                target = "Neck"
-            else:
-                for src, tgt in (("Arm",      "Hand"),
-                                 ("Shoulder","Arm"),
-                                 ("Leg",      "Knee"),
-                                 ("Knee",     "Foot")):
-                    if name == src + "L" or name == src + "R":
-                        target = tgt + name[-1]
-                        break
-
+            target = LIMB_TARGETS.get(name)
             if target:
-                other = edit_bones.get(target)
+                other = eb_by_name.get(target)
                 if other:
                     eb.length = (other.head - eb.head).length
                 continue
@@ -1428,8 +1547,8 @@ class SSB_OT_RevertUltiBones(bpy.types.Operator):
         # Override bypasses the “nothing to revert” check
         if scene.ssb4_override_lock:
             return True
-        # Otherwise only if there *is* a snapshot
-        return obj.as_pointer() in ORIGINAL_BONE_DATA
+        # Otherwise only if there *is* a conversion
+        return ULTI_CONVERTED_PROP in obj
 
 
     def execute(self, context):
@@ -1437,8 +1556,12 @@ class SSB_OT_RevertUltiBones(bpy.types.Operator):
         obj   = scene.objects.active
         arm_key = obj.as_pointer()
 
-        data = ORIGINAL_BONE_DATA.get(arm_key)
-        if not data:
+        # Taken out up front; put back if the revert can't go ahead
+        data = ORIGINAL_BONE_DATA.pop(arm_key, None)
+        if data is None:
+            # The snapshot only lives for this session; drop a flag left over from a saved file
+            if ULTI_CONVERTED_PROP in obj:
+                del obj[ULTI_CONVERTED_PROP]
             self.report({'ERROR'}, "No conversion to revert on %s" % obj.name)
             return {'CANCELLED'}
 
@@ -1448,22 +1571,37 @@ class SSB_OT_RevertUltiBones(bpy.types.Operator):
             target_format='SSBU',
             ignore_scope=True)
         if not ok:
+            ORIGINAL_BONE_DATA[arm_key] = data
             self.report({'ERROR'}, "Failed to normalize to SSBU before revert")
             return {'CANCELLED'}
 
         # 2) Restore head/tail/roll exactly
-        bpy.ops.object.mode_set(mode='EDIT')
+        prev_mode = obj.mode
+        if prev_mode != 'EDIT':
+            bpy.ops.object.mode_set(mode='EDIT')
         arm = obj.data
         edit_bones = arm.edit_bones
 
-        for eb in edit_bones:
-            orig = data.get(eb.name)
-            if orig:
-                eb.head = orig['head']
-                eb.tail = orig['tail']
-                eb.roll = orig['roll']
-
-        bpy.ops.object.mode_set(mode='OBJECT')
+        names = data['names']
+        heads, tails, rolls = data['head'], data['tail'], data['roll']
+        if [eb.name for eb in edit_bones] == names:
+            # Same bones in the same order: write the arrays straight back
+            edit_bones.foreach_set("head", heads)
+            edit_bones.foreach_set("tail", tails)
+            edit_bones.foreach_set("roll", rolls)
+        else:
+            # Bones were added or removed since the conversion: restore the ones we know
+            name_to_idx = {n: i for i, n in enumerate(names)}
+            for eb in edit_bones:
+                i = name_to_idx.get(eb.name)
+                if i is not None:
+                    eb.head = heads[i * 3:i * 3 + 3]
+                    eb.tail = tails[i * 3:i * 3 + 3]
+                    eb.roll = rolls[i]
+
+        # Leaving edit mode writes the edit bones back before the rename below.
+        # Return to the mode we came from, or OBJECT if we started in EDIT.
+        bpy.ops.object.mode_set(mode='OBJECT' if prev_mode == 'EDIT' else prev_mode)
 
         # 3) Rename back to original scheme
         last = data['last_scheme']
@@ -1476,14 +1614,117 @@ class SSB_OT_RevertUltiBones(bpy.types.Operator):
                 target_format=prefs.valve_bone_format,
                 ignore_scope=True)
 
-        # 4) Clean up
-        del ORIGINAL_BONE_DATA[arm_key]
+        # 4) Clean up (the snapshot was already popped)
+        if ULTI_CONVERTED_PROP in obj:
+            del obj[ULTI_CONVERTED_PROP]
         self.report({'INFO'}, "Reverted smash-ultimate conversion on {obj.name}")
         return {'FINISHED'}
 
 # ------------------------------------------------------------
 # Operator: Group Bones into Collections and Assign Colors
 # ------------------------------------------------------------
+
+# Canonical names and suffixes of bones that go to the "System Bones" group
+SYSTEM_NAMES = frozenset(('TransN', 'Trans', 'RotN', 'Rot', 'ThrowN', 'Throw'))
+SYSTEM_SUFFIXES = ('_null', '_eff', '_offset')
+
+# Canonical name classifier. Alternatives are tried in priority order at the start of the name:
+# "finger" anywhere (any case), then the H_Exo_ and H_ helper prefixes, then system names/suffixes
+CANON_RE = re.compile(
+    r"(?P<finger>(?=.*[Ff][Ii][Nn][Gg][Ee][Rr]))"
+    r"|(?P<exo>H_Exo_)"
+    r"|(?P<helper>H_)"
+    r"|(?P<system>(?:%s)\Z|.*(?:%s)\Z)" % (
+        "|".join(map(re.escape, sorted(SYSTEM_NAMES))),
+        "|".join(map(re.escape, SYSTEM_SUFFIXES))), re.DOTALL)
+CANON_RE_GROUPS = {
+    "finger": "Finger Bones",
+    "exo":    '"Exo" Helper Bones',
+    "helper": "Helper Bones",
+    "system": "System Bones",
+}
+
+# Canonical name -> group name. Classification depends only on the name, so results are kept across runs
+CANON_GROUPS = {}
+
+def canon_group(canon):
+    """Return the group a mapped bone belongs in, from its canonical (SSBU) name."""
+    group = CANON_GROUPS.get(canon)
+    if group is None:
+        m = CANON_RE.match(canon) if canon else None
+        group = CANON_RE_GROUPS[m.lastgroup] if m else "Standard Bones"
+        CANON_GROUPS[canon] = group
+    return group
+
+def is_deformed_by(obj, arma):
+    """Return True if a mesh object is deformed by the given armature object."""
+    for mod in obj.modifiers:
+        if mod.type == 'ARMATURE' and mod.object == arma:
+            return True
+    # Legacy armature parenting deforms without a modifier
+    return obj.parent == arma and obj.parent_type == 'ARMATURE'
+
+def weighted_vertex_group_names(meshes):
+    """Return the names of vertex groups that have at least one vertex assigned, over the given meshes."""
+    used = set()
+    for obj in meshes:
+        idx_to_name = {vg.index: vg.name for vg in obj.vertex_groups}
+        if not idx_to_name:
+            continue
+        # Stop walking vertices once every group of this mesh has been seen
+        remaining = set(idx_to_name)
+        for v in obj.data.vertices:
+            for g in v.groups:
+                remaining.discard(g.group)
+            if not remaining:
+                break
+        used.update(name for idx, name in idx_to_name.items() if idx not in remaining)
+    return used
+
+# --- Group structure and colors ---
+GROUP_ORDER = (
+    "Standard Bones",
+    "Finger Bones",
+    "Helper Bones",
+    '"Exo" Helper Bones',
+    "Swing Bones",
+    "Null Swing Bones",
+    "System Bones",
+    "Empty Bones",
+)
+GROUP_COLORS = {
+    "Standard Bones":     'DEFAULT',
+    "Finger Bones":       'THEME07',
+    "Helper Bones":       'THEME06',
+    '"Exo" Helper Bones': 'THEME09',
+    "Swing Bones":        'THEME04',
+    "Null Swing Bones":   'THEME10',
+    "System Bones":       'THEME10',
+    "Empty Bones":        'THEME01',
+}
+GROUP_INDEX = { name: i for i, name in enumerate(GROUP_ORDER) }
+
+# Character -> {mapped bone name: GROUP_ORDER index}, filled on first use and cleared on register()
+GROUP_MAP_CACHE = {}
+
+def bonemap_group_map(character):
+    """Return the group index of every name in the Common + character bonemaps, building it once per character."""
+    name_groups = GROUP_MAP_CACHE.get(character)
+    if name_groups is None:
+        _, _, common_maps = CHARACTER_BONE_MAPS.get("Common", (False, False, []))
+        _, _, char_maps   = CHARACTER_BONE_MAPS.get(character, (False, False, []))
+        name_groups = {}
+        for entry in common_maps + char_maps:
+            if any(n.endswith(('_null', '_shit')) for n in entry):
+                group_i = GROUP_INDEX["Null Swing Bones"]
+            else:
+                group_i = GROUP_INDEX[canon_group(entry[3])]
+            # A name belongs to the first entry that lists it
+            for n in entry:
+                name_groups.setdefault(n, group_i)
+        GROUP_MAP_CACHE[character] = name_groups
+    return name_groups
+
 class SSB_OT_GroupBones(bpy.types.Operator):
     """Group bones according to bonemap prefixes and patterns"""
     bl_idname = "ssb4.group_bones"
@@ -1499,121 +1740,66 @@ class SSB_OT_GroupBones(bpy.types.Operator):
         arma = context.scene.objects.active
         pg = arma.pose.bone_groups
 
-        # --- Group structure and colors ---
-        group_order = [
-            "Standard Bones",
-            "Finger Bones",
-            "Helper Bones",
-            '"Exo" Helper Bones',
-            "Swing Bones",
-            "Null Swing Bones",
-            "System Bones",
-            "Empty Bones",
-        ]
-        group_colors = {
-            "Standard Bones":     'DEFAULT',
-            "Finger Bones":       'THEME07',
-            "Helper Bones":       'THEME06',
-            '"Exo" Helper Bones': 'THEME09',
-            "Swing Bones":        'THEME04',
-            "Null Swing Bones":   'THEME10',
-            "System Bones":       'THEME10',
-            "Empty Bones":       'THEME01',
-        }
-        buckets = { name: [] for name in group_order }
-        pre_existing = { name: (pg.get(name) is not None) for name in group_order }
-
-        # --- Bonemap + weight helper sets ---
-        _, _, common_maps = CHARACTER_BONE_MAPS.get("Common", (False, False, []))
-        _, _, char_maps   = CHARACTER_BONE_MAPS.get(context.scene.ssb4_character, (False, False, []))
-        maps = common_maps + char_maps
-
-        all_mapped_names = set()
-        for entry in maps:
-            all_mapped_names.update(entry)
-
-        def get_bonemap_entry(bone_name):
-            if bone_name in all_mapped_names:
-                return next((e for e in maps if bone_name in e), None)
-            if bone_name.startswith("ValveBiped.") and bone_name[len("ValveBiped."):] in all_mapped_names:
-                return next((e for e in maps if bone_name[len("ValveBiped."):] in e), None)
-            return None
-
-        def has_vertex_weights(bone_name):
-            for obj in bpy.data.objects:
-                if obj.type != 'MESH':
-                    continue
-                if bone_name in obj.vertex_groups:
-                    vg_idx = obj.vertex_groups[bone_name].index
-                    for v in obj.data.vertices:
-                        if any(g.group == vg_idx for g in v.groups):
-                            return True
-            return False
+        # Buckets are a list parallel to GROUP_ORDER, addressed by index
+        buckets = [ [] for _ in GROUP_ORDER ]
+        null_i = GROUP_INDEX["Null Swing Bones"]
+        swing_i = GROUP_INDEX["Swing Bones"]
+        empty_i = GROUP_INDEX["Empty Bones"]
+        # Existing groups by name, read once instead of keyed lookups on the collection
+        existing = { g.name: g for g in pg }
 
-        # --- Bone classification ---
-        system_names = {'TransN','Trans','RotN','Rot','ThrowN','Throw'}
-        system_suffixes = ('_null','_eff','_offset')
-        assigned = set()
+        # --- Bonemap groups (built once per character) ---
+        name_groups = bonemap_group_map(context.scene.ssb4_character)
+
+        # --- Bone classification (single pass; each bone goes to at most one bucket) ---
+        unmapped = []
 
         for pb in arma.pose.bones:
             name = pb.name
-            entry = get_bonemap_entry(name)
-            canon = entry[3] if entry else None
+            entry_group = name_groups.get(name)
+            if entry_group is None and name.startswith(VALVEBIPED_PREFIX):
+                entry_group = name_groups.get(name[VALVEBIPED_LEN:])
 
             # _null/_shit detection first
-            if name.endswith('_null') or name.endswith('_shit') or (
-                entry and any(n.endswith('_null') or n.endswith('_shit') for n in entry)
-            ):
-                buckets["Null Swing Bones"].append(pb)
-                assigned.add(name)
-                continue
+            if name.endswith(('_null', '_shit')) or entry_group == null_i:
+                buckets[null_i].append(pb)
 
             # Swing detection (SSB4 SWG_*__swing or SSBU S_*)
-            if name.startswith("SWG_") or name.endswith("_swing") or name.startswith("S_"):
-                buckets["Swing Bones"].append(pb)
-                assigned.add(name)
-                continue
+            elif name.startswith(SWING_PREFIXES) or name.endswith("_swing"):
+                buckets[swing_i].append(pb)
 
-            if entry:
-                if canon and 'finger' in canon.lower():
-                    buckets["Finger Bones"].append(pb)
-                elif canon and canon.startswith("H_Exo_"):
-                    buckets['"Exo" Helper Bones'].append(pb)
-                elif canon and canon.startswith("H_"):
-                    buckets["Helper Bones"].append(pb)
-                elif canon and (canon in system_names or canon.endswith(system_suffixes)):
-                    buckets["System Bones"].append(pb)
-                else:
-                    buckets["Standard Bones"].append(pb)
-                assigned.add(name)
-                continue
+            elif entry_group is not None:
+                buckets[entry_group].append(pb)
+
+            else:
+                # Unmapped: an Empty Bone unless some mesh weights it, checked below
+                unmapped.append(pb)
 
         # --- Final pass: Empty Bones (unmapped, unweighted) ---
-        for pb in arma.pose.bones:
-            name = pb.name
-            if name in assigned:
-                continue
-            if name in all_mapped_names or (
-                name.startswith("ValveBiped.") and name[len("ValveBiped."):] in all_mapped_names
-            ):
-                continue
-            if not has_vertex_weights(name):
-                buckets["Empty Bones"].append(pb)
-                assigned.add(name)
+        if unmapped:
+            # One scan of this armature's meshes instead of every mesh once per unmapped bone
+            meshes = [o for o in bpy.data.objects if o.type == 'MESH' and is_deformed_by(o, arma)]
+            weighted = weighted_vertex_group_names(meshes)
+            for pb in unmapped:
+                if pb.name not in weighted:
+                    buckets[empty_i].append(pb)
 
         # --- Apply bone groups ---
         created = 0
         assigned_count = 0
-        for group in group_order:
-            bones = buckets[group]
+        for group, bones in zip(GROUP_ORDER, buckets):
             if not bones:
                 continue
-            if not pre_existing[group]:
+            grp = existing.get(group)
+            if grp is None:
+                grp = existing[group] = pg.new(group)
                 created += 1
-            grp = pg.get(group) or pg.new(group)
-            grp.color_set = group_colors[group]
+            grp.color_set = GROUP_COLORS[group]
+            # Compare groups by pointer: wrappers fetched separately are never identical objects
+            grp_ptr = grp.as_pointer()
             for pb in bones:
-                if not pb.bone_group or pb.bone_group.name != group:
+                cur = pb.bone_group
+                if cur is None or cur.as_pointer() != grp_ptr:
                     pb.bone_group = grp
                     assigned_count += 1
 
@@ -1787,9 +1973,19 @@ classes = (
 )
 
 def register():
+    GROUP_MAP_CACHE.clear()
     load_custom_icons()
-    for cls in classes:
-        bpy.utils.register_class(cls)
+    registered = []
+    try:
+        for cls in classes:
+            bpy.utils.register_class(cls)
+            registered.append(cls)
+    except Exception:
+        # Roll back so a failed enable doesn't leave the addon half registered
+        for cls in reversed(registered):
+            bpy.utils.unregister_class(cls)
+        unload_custom_icons()
+        raise
 
 def unregister():
     for cls in reversed(classes):